@@ -1,13 +1,22 @@
+import logging
 import os
+import re
+import orjson
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from bson import ObjectId
+from pymongo.collation import Collation
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, PyMongoError
 
 from database import db, create_document, get_documents
 from schemas import Product as ProductSchema, Banner as BannerSchema
 
+logger = logging.getLogger(__name__)
+
 class ProductOut(BaseModel):
     id: str
     title: str
@@ -31,7 +40,46 @@ class BannerOut(BaseModel):
     image: Optional[str] = None
     slug: str
 
-app = FastAPI(title="Clothing Store API")
+# Adapters for the list endpoints: dump straight to JSON bytes instead of
+# going model -> dict -> JSON through FastAPI's response_model handling.
+_products_adapter = TypeAdapter(List[ProductOut])
+_banners_adapter = TypeAdapter(List[BannerOut])
+
+# Only fetch the fields the output models use (_id is always returned).
+_PRODUCT_PROJECTION = {
+    "title": 1,
+    "description": 1,
+    "price": 1,
+    "category": 1,
+    "images": 1,
+    "sizes": 1,
+    "in_stock": 1,
+    "is_trending": 1,
+    "is_new": 1,
+    "is_best_seller": 1,
+    "season": 1,
+    "on_sale": 1,
+    "sale_price": 1,
+}
+_TEXT_SCORE = {"$meta": "textScore"}
+_PRODUCT_SEARCH_PROJECTION = {**_PRODUCT_PROJECTION, "score": _TEXT_SCORE}
+# Text search matches whole (stemmed) words, so very short queries fall
+# back to an anchored, case-insensitive title prefix regex.
+_MIN_TEXT_QUERY = 3
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+_BANNER_PROJECTION = {"_id": 1, "title": 1, "subtitle": 1, "image": 1, "slug": 1}
+
+_CATEGORIES = ["Men", "Women", "Kids", "Winter Collection", "Summer Collection", "Sale Items"]
+_CATEGORIES_BYTES = orjson.dumps(_CATEGORIES)
+
+# Banners are cached per minute; product listings per filter combination.
+# Handlers all run on the event loop, so the caches need no locking.
+_banners_cache = TTLCache(maxsize=1, ttl=60)
+_products_cache = TTLCache(maxsize=256, ttl=30)
+# /test is polled as a health check; don't list collections on every hit.
+_collections_cache = TTLCache(maxsize=1, ttl=10)
+
+app = FastAPI(title="Clothing Store API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,31 +89,100 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def serialize_product(doc) -> ProductOut:
-    return ProductOut(
-        id=str(doc.get("_id")),
-        title=doc.get("title"),
-        description=doc.get("description"),
-        price=float(doc.get("price", 0)),
-        category=doc.get("category"),
-        images=[str(x) for x in doc.get("images", [])],
-        sizes=[str(x) for x in doc.get("sizes", [])],
-        in_stock=bool(doc.get("in_stock", True)),
-        is_trending=bool(doc.get("is_trending", False)),
-        is_new=bool(doc.get("is_new", False)),
-        is_best_seller=bool(doc.get("is_best_seller", False)),
-        season=doc.get("season"),
-        on_sale=bool(doc.get("on_sale", False)),
-        sale_price=float(doc.get("sale_price")) if doc.get("sale_price") is not None else None,
+# (collection, keys, options) for every index the queries below rely on.
+_INDEXES = [
+    ("product", [("category", 1)], {}),
+    ("product", [("category", 1), ("season", 1)], {}),
+    ("product", [("is_new", 1)], {}),
+    ("product", [("is_best_seller", 1)], {}),
+    ("product", [("on_sale", 1)], {}),
+    ("product", [("title", 1)], {"collation": Collation(locale="en", strength=2)}),
+    ("product", [("title", "text"), ("description", "text")], {}),
+    # Homepage listings filter only on the boolean flags (plus category).
+    (
+        "product",
+        [("is_trending", 1), ("is_new", 1), ("is_best_seller", 1), ("on_sale", 1), ("category", 1), ("title", 1)],
+        {},
+    ),
+    ("banner", [("slug", 1)], {"unique": True}),
+]
+
+@app.on_event("startup")
+async def create_indexes():
+    # Best effort: a missing index only slows queries down, so never keep the
+    # app from starting (an unreachable database is reported by /test).
+    if db is None:
+        return
+    for collection, keys, options in _INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except ConnectionFailure as e:
+            logger.warning("Skipping index creation, database unreachable: %s", e)
+            return
+        except PyMongoError as e:
+            logger.warning("Could not create index %s on %s: %s", keys, collection, e)
+
+def _json_response(content: bytes) -> Response:
+    # Body is already encoded JSON; hand it through without re-rendering.
+    return Response(content=content, media_type="application/json")
+
+# Documents come from our own collections, so the output models are built
+# with model_construct (no validation). serialize_product is generated once
+# from ProductOut's fields as a single straight-line call: required fields
+# are read with doc[...] (except price, which has always fallen back to 0),
+# bool/float fields keep their bool()/float() coercion so stored nulls or
+# ints still match the schema, and images/sizes are stored as strings
+# (validated by the Product schema) so they only need a fallback when missing.
+_REQUIRED_FALLBACKS = {"price": 0.0}
+
+def _optional_float(value):
+    return None if value is None else float(value)
+
+_COERCIONS = {bool: "bool", float: "float", Optional[float]: "_optional_float"}
+
+def _build_product_serializer():
+    namespace = {"_construct": ProductOut.model_construct, "_optional_float": _optional_float}
+    args = ["id=str(doc['_id'])"]
+    for name, field in ProductOut.model_fields.items():
+        if name == "id":
+            continue
+        if name in _REQUIRED_FALLBACKS:
+            namespace[f"_d_{name}"] = _REQUIRED_FALLBACKS[name]
+            value = f"get({name!r}, _d_{name})"
+        elif field.is_required():
+            value = f"doc[{name!r}]"
+        elif field.default_factory is not None:
+            raise TypeError(f"Cannot generate serialize_product: ProductOut.{name} uses default_factory")
+        elif field.default == []:
+            value = f"get({name!r}) or []"
+        else:
+            # Bind the default itself rather than its repr, which need not be valid source.
+            namespace[f"_d_{name}"] = field.default
+            value = f"get({name!r}, _d_{name})"
+        coerce = _COERCIONS.get(field.annotation)
+        args.append(f"{name}={coerce}({value})" if coerce else f"{name}={value}")
+    source = (
+        "def serialize_product(doc):\n"
+        "    get = doc.get\n"
+        f"    return _construct({', '.join(args)})\n"
     )
+    exec(compile(source, "<generated serialize_product>", "exec"), namespace)
+    func = namespace["serialize_product"]
+    func.__module__ = __name__
+    func.__qualname__ = "serialize_product"
+    return func
+
+serialize_product = _build_product_serializer()
 
+# A banner without title or slug fails loudly rather than going out with
+# nulls the schema doesn't allow.
 def serialize_banner(doc) -> BannerOut:
-    return BannerOut(
-        id=str(doc.get("_id")),
-        title=doc.get("title"),
+    return BannerOut.model_construct(
+        id=str(doc["_id"]),
+        title=doc["title"],
         subtitle=doc.get("subtitle"),
         image=doc.get("image"),
-        slug=doc.get("slug"),
+        slug=doc["slug"],
     )
 
 @app.get("/")
@@ -73,7 +190,7 @@ def read_root():
     return {"message": "Clothing Store Backend Running"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -88,7 +205,10 @@ def test_database():
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = db.name
             response["connection_status"] = "Connected"
-            response["collections"] = db.list_collection_names()
+            collections = _collections_cache.get("collections")
+            if collections is None:
+                collections = _collections_cache["collections"] = await db.list_collection_names()
+            response["collections"] = collections
         else:
             response["database"] = "⚠️ Not initialized"
     except Exception as e:
@@ -97,20 +217,30 @@ def test_database():
 
 @app.get("/api/categories")
 def get_categories():
-    return ["Men", "Women", "Kids", "Winter Collection", "Summer Collection", "Sale Items"]
+    return _json_response(_CATEGORIES_BYTES)
 
-@app.get("/api/banners", response_model=List[BannerOut])
-def get_banners():
-    docs = list(db["banner"].find()) if db else []
-    return [serialize_banner(d) for d in docs]
+# The list endpoints return pre-serialized JSON; `responses` documents the
+# schema without FastAPI re-validating every item as response_model would.
+@app.get("/api/banners", responses={200: {"model": List[BannerOut]}})
+async def get_banners() -> Response:
+    content = _banners_cache.get("banners")
+    if content is None:
+        docs = await db["banner"].find({}, _BANNER_PROJECTION).to_list(length=None) if db is not None else []
+        banners = [serialize_banner(d) for d in docs]
+        content = _banners_cache["banners"] = _banners_adapter.dump_json(banners)
+    return _json_response(content)
 
 @app.post("/api/banners", response_model=str)
-def create_banner(payload: BannerSchema):
-    banner_id = create_document("banner", payload)
+async def create_banner(payload: BannerSchema):
+    try:
+        banner_id = await create_document("banner", payload)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Banner slug already exists")
+    _banners_cache.clear()
     return banner_id
 
-@app.get("/api/products", response_model=List[ProductOut])
-def list_products(
+@app.get("/api/products", responses={200: {"model": List[ProductOut]}})
+async def list_products(
     category: Optional[str] = None,
     trending: Optional[bool] = Query(None),
     new: Optional[bool] = Query(None),
@@ -119,9 +249,14 @@ def list_products(
     sale: Optional[bool] = Query(None),
     q: Optional[str] = None,
     limit: int = Query(24, ge=1, le=100),
-):
+) -> Response:
     if db is None:
-        return []
+        return _json_response(b"[]")
+    # Empty strings filter the same as missing ones; share their cache entry.
+    key = (category or None, season or None, trending, new, best, sale, q or None, limit)
+    content = _products_cache.get(key)
+    if content is not None:
+        return _json_response(content)
     filt = {}
     if category:
         filt["category"] = category
@@ -135,36 +270,47 @@ def list_products(
         filt["is_best_seller"] = best
     if sale is not None:
         filt["on_sale"] = sale
-    if q:
-        filt["title"] = {"$regex": q, "$options": "i"}
-    docs = db["product"].find(filt).limit(limit)
-    return [serialize_product(d) for d in docs]
+    projection = _PRODUCT_PROJECTION
+    text_search = bool(q) and len(q) >= _MIN_TEXT_QUERY
+    if text_search:
+        filt["$text"] = {"$search": q}
+        projection = _PRODUCT_SEARCH_PROJECTION
+    elif q:
+        filt["title"] = {"$regex": f"^{re.escape(q)}", "$options": "i"}
+    docs = db["product"].find(filt, projection)
+    if text_search:
+        docs = docs.sort([("score", _TEXT_SCORE)])
+    # limit is capped at 100, so fetch everything in the first batch.
+    docs = await docs.limit(limit).batch_size(limit).to_list(length=limit)
+    products = [serialize_product(d) for d in docs]
+    content = _products_cache[key] = _products_adapter.dump_json(products)
+    return _json_response(content)
 
 @app.get("/api/products/{product_id}", response_model=ProductOut)
-def get_product(product_id: str):
+async def get_product(product_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    try:
-        doc = db["product"].find_one({"_id": ObjectId(product_id)})
-    except Exception:
+    if not _OID_RE.fullmatch(product_id):
         raise HTTPException(status_code=400, detail="Invalid product id")
+    doc = await db["product"].find_one({"_id": ObjectId(product_id)}, _PRODUCT_PROJECTION)
     if not doc:
         raise HTTPException(status_code=404, detail="Product not found")
     return serialize_product(doc)
 
 @app.post("/api/products", response_model=str)
-def create_product(payload: ProductSchema):
-    product_id = create_document("product", payload)
+async def create_product(payload: ProductSchema):
+    product_id = await create_document("product", payload)
+    _products_cache.clear()
     return product_id
 
 @app.get("/api/seed")
-def seed_data():
+async def seed_data():
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
 
     created = {"products": 0, "banners": 0}
 
-    if db["banner"].count_documents({}) == 0:
+    if await db["banner"].estimated_document_count() == 0 and await db["banner"].find_one() is None:
         banners = [
             {
                 "title": "Mega Sale",
@@ -185,11 +331,17 @@ def seed_data():
                 "slug": "limited-stock",
             },
         ]
-        for b in banners:
-            db["banner"].insert_one(b)
-            created["banners"] += 1
+        try:
+            result = await db["banner"].insert_many(banners, ordered=False)
+            created["banners"] = len(result.inserted_ids)
+        except BulkWriteError as e:
+            # A concurrent seed inserted some slugs first; report what this
+            # call added. Any other write failure is a real error.
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+            created["banners"] = e.details["nInserted"]
 
-    if db["product"].count_documents({}) == 0:
+    if await db["product"].estimated_document_count() == 0 and await db["product"].find_one() is None:
         sample_products = [
             {
                 "title": "Classic Black Tee",
@@ -241,10 +393,12 @@ def seed_data():
                 "on_sale": False,
             },
         ]
-        for p in sample_products:
-            db["product"].insert_one(p)
-            created["products"] += 1
+        result = await db["product"].insert_many(sample_products, ordered=False)
+        created["products"] = len(result.inserted_ids)
 
+    _banners_cache.clear()
+    _products_cache.clear()
+    _collections_cache.clear()
     return {"status": "ok", **created}
 
 if __name__ == "__main__":